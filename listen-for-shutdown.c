@@ -0,0 +1,117 @@
+/*
+ * ------------------------------------------------------------------------------
+ * Name:         listen-for-shutdown.c
+ * Description:  Native version of listen-for-shutdown.py for boards where the
+ *               resident Python interpreter is too heavy. It waits for a
+ *               falling edge on GPIO pin 3 using libgpiod line events, debounces,
+ *               verifies the pin is still LOW, then broadcasts a message with
+ *               "wall" and halts the system.
+ *
+ * Build:        gcc -O2 -Wall -o listen-for-shutdown listen-for-shutdown.c -lgpiod
+ *               (needs libgpiod 1.5-1.6, i.e. the v1 API; it does not build
+ *               against libgpiod 2.x, which removed the gpiod_line_* calls)
+ *
+ * Notes:
+ *   - Sends READY=1 to systemd, so it can replace the Python script in
+ *     listen-for-shutdown.service without changing Type=notify.
+ *   - (c) 2025 Tiran Dagan
+ * ------------------------------------------------------------------------------
+ */
+#include <gpiod.h>
+#include <stddef.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <time.h>
+#include <unistd.h>
+
+/* Define the GPIO pin for the button */
+#define BUTTON_PIN 3
+/* GPIO character device used for kernel line events */
+#define GPIO_CHIP "gpiochip0"
+/* Settle time before re-reading the pin; set to 0 if a hardware debounce capacitor is fitted */
+#define DEBOUNCE_US 50000
+
+/* Send an sd_notify(3) message when running under a Type=notify unit */
+static void notify_systemd(const char *state)
+{
+	const char *path = getenv("NOTIFY_SOCKET");
+	struct sockaddr_un addr = { .sun_family = AF_UNIX };
+	size_t len;
+	int fd;
+
+	if (!path || !*path)
+		return;
+	len = strlen(path);
+	if (len >= sizeof(addr.sun_path))
+		return;
+	memcpy(addr.sun_path, path, len);
+	/* Abstract namespace sockets are announced with a leading "@" */
+	if (addr.sun_path[0] == '@')
+		addr.sun_path[0] = '\0';
+
+	fd = socket(AF_UNIX, SOCK_DGRAM | SOCK_CLOEXEC, 0);
+	if (fd < 0)
+		return;
+	sendto(fd, state, strlen(state), 0, (struct sockaddr *)&addr,
+	       offsetof(struct sockaddr_un, sun_path) + len);
+	close(fd);
+}
+
+int main(void)
+{
+	const struct timespec no_wait = { 0, 0 };
+	struct gpiod_line_event event;
+	struct gpiod_chip *chip;
+	struct gpiod_line *line;
+
+	/* Check if program is run as root */
+	if (geteuid() != 0) {
+		fprintf(stderr, "This program must be run as root (sudo). Exiting.\n");
+		return 1;
+	}
+
+	chip = gpiod_chip_open_by_name(GPIO_CHIP);
+	if (!chip) {
+		perror("Opening " GPIO_CHIP);
+		return 1;
+	}
+
+	/* For normally open button with pull-up, we're looking for HIGH->LOW transition */
+	line = gpiod_chip_get_line(chip, BUTTON_PIN);
+	if (!line || gpiod_line_request_falling_edge_events_flags(line, "shutdown-btn",
+			GPIOD_LINE_REQUEST_FLAG_BIAS_PULL_UP) < 0) {
+		perror("Requesting button line");
+		gpiod_chip_close(chip);
+		return 1;
+	}
+
+	printf("Monitoring button on GPIO pin %d using gpiod line events...\n", BUTTON_PIN);
+	fflush(stdout);
+	notify_systemd("READY=1");
+
+	/* Block in the kernel until an edge arrives; no timeout */
+	while (gpiod_line_event_wait(line, NULL) == 1) {
+		if (gpiod_line_event_read(line, &event) < 0)
+			break;
+		/* Debounce */
+		if (DEBOUNCE_US)
+			usleep(DEBOUNCE_US);
+		/* Discard bounce edges queued while settling without blocking */
+		while (gpiod_line_event_wait(line, &no_wait) == 1)
+			gpiod_line_event_read(line, &event);
+		/* Verify state is still LOW */
+		if (gpiod_line_get_value(line) == 0) {
+			printf("Button press detected. Initiating shutdown...\n");
+			fflush(stdout);
+			system("wall 'Shutdown initiated by button press.'; exec halt");
+		}
+	}
+
+	perror("Waiting for button events");
+	gpiod_line_release(line);
+	gpiod_chip_close(chip);
+	return 1;
+}
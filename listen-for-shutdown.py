@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
 # ------------------------------------------------------------------------------
-# Name:         pi-power-button-extended.py
+# Name:         listen-for-shutdown.py
 # Description:  This script monitors a physical push-button connected to GPIO pin 3
-#               on a Raspberry Pi. It supports both Normally Open (NO) and Normally
-#               Closed (NC) buttons. When a button press is detected (a transition
-#               in pin state), the script broadcasts a message to all logged-in
-#               users via the "wall" command and then initiates a system shutdown
-#               via the "shutdown" command.
+#               on a Raspberry Pi. When the pin goes from HIGH to LOW (a falling
+#               edge) and is still LOW after debouncing, the script broadcasts a
+#               message to all logged-in users via the "wall" command and then
+#               halts the system via the "halt" command.
 #
-#               A short debounce delay helps mitigate false triggers caused by
-#               mechanical bouncing. This script performs a single detection:
-#               once it detects an edge (open->closed or closed->open) and confirms
-#               the state has changed, it proceeds to shut down immediately.
+#               With a Normally Open (NO) button this happens when the button is
+#               pressed. A Normally Closed (NC) button holds the pin LOW at rest
+#               and releases it while pressed, so the shutdown fires when the
+#               button is released again.
+#
+#               Edges are received from the kernel through libgpiod line events on
+#               /dev/gpiochip0; RPi.GPIO edge detection is used only when the gpiod
+#               bindings are not installed. A short debounce delay followed by a
+#               re-read of the pin helps mitigate false triggers caused by
+#               mechanical bouncing.
 #
 # Wiring/Usage:
 #   1. Connect a momentary push button between GPIO pin 3 (BCM numbering) and GND.
@@ -20,124 +25,202 @@
 #        and LOW when pressed.
 #      - For a Normally Closed button, the pin will read LOW when not pressed,
 #        and HIGH when pressed.
-#   3. Make the script executable (chmod +x pi-power-button-extended.py).
-#   4. Run it (usually as root or via sudo, so it can call "shutdown").
+#   3. Optional: add hardware debounce with a 4.7 uF capacitor across the button
+#      (GPIO pin 3 to GND) and ~100 Ohm in series with the capacitor to limit the
+#      discharge current through the contacts. Together with the 1.8 kOhm pull-up
+#      soldered on the board for GPIO3/SCL this gives a ~8.5 ms time constant,
+#      longer than typical contact bounce (1-10 ms). Smaller capacitors such as
+#      100 nF (~0.18 ms) only suppress short glitches, not bounce. Do not put a
+#      resistor in series with the button itself: it forms a divider with the
+#      1.8 kOhm pull-up, so a press still reads HIGH and wake-from-halt stops
+#      working. With the 4.7 uF capacitor fitted, DEBOUNCE_S can be set to 0 to
+#      skip the software settle delay.
+#   4. Install it with script/install, which runs it as listen-for-shutdown.service,
+#      or run it by hand as root (sudo) so it can call "halt".
 #
 # Notes:
 #   - Based on the original project by Howchoo (https://howchoo.com/pi/pi-power-button).
 #   - (c) 2025 Tiran Dagan
 # ------------------------------------------------------------------------------
 # Import necessary modules
-import RPi.GPIO as GPIO
 import subprocess
-import time
+import select
+import socket
+import threading
 import signal
 import sys
 import os
 
+try:
+    import gpiod
+except ImportError:
+    gpiod = None
+
+# Only the libgpiod v1 bindings (Chip.get_line / LINE_REQ_*) are supported
+if gpiod is not None and not hasattr(gpiod, "LINE_REQ_EV_FALLING_EDGE"):
+    gpiod = None
+
+# RPi.GPIO is imported lazily in main() only when the gpiod path is unavailable
+GPIO = None
+
 # Define the GPIO pin for the button
 BUTTON_PIN = 3
-shutdown_triggered = False
+# GPIO character device used for kernel line events
+GPIO_CHIP = "gpiochip0"
+# Settle time before re-reading the pin; set to 0 if a hardware debounce capacitor (see above) is fitted
+DEBOUNCE_S = 0.05
+# Set by the RPi.GPIO callback thread; the main thread does the actual work
+button_pressed = threading.Event()
 
 def shutdown_system():
     """Function to broadcast message and shutdown the system"""
     print("Button press detected. Initiating shutdown...")
-    subprocess.run(["sudo", "wall", "Shutdown initiated by button press."])
-    #time.sleep(3)  # 1 second delay before shutdown
-    sync_result = subprocess.run(["sudo", "sync"], capture_output=True,shell=False)
-    if sync_result.returncode == 0:
-        subprocess.run(["sudo", "halt"],shell=False)
-    else:
-        subprocess.run(["sudo", "wall", "Sync failed, aborting shutdown."],shell=False)
+    # One fork from Python; halt syncs on its own and replaces the shell
+    subprocess.run(["/bin/sh", "-c",
+                    "wall 'Shutdown initiated by button press.'; exec halt"],
+                   shell=False)
+
+def notify_systemd(state):
+    """Send an sd_notify(3) message when running under a Type=notify unit"""
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return
+    # Abstract namespace sockets are announced with a leading "@"
+    if address.startswith("@"):
+        address = "\0" + address[1:]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.connect(address)
+        sock.sendall(state.encode())
 
 def button_callback(channel):
     """Callback function that will be executed when button is pressed"""
-    global shutdown_triggered
-    
-    # Debounce
-    time.sleep(0.05)
-    
-    # Prevent multiple rapid shutdowns
-    if not shutdown_triggered:
-        shutdown_triggered = True
-        shutdown_system()
+    # Hand off to the main thread so the callback thread returns immediately
+    button_pressed.set()
 
 def cleanup_handler(signum, frame):
     """Handle cleanup when the script is terminated"""
-    GPIO.cleanup()
+    if GPIO is not None:
+        GPIO.cleanup()
     sys.exit(0)
 
-def poll_button():
-    """Polling-based approach as a fallback if event detection fails"""
-    print("Using polling method for button detection...")
-    prev_state = GPIO.input(BUTTON_PIN)
+def ignore_signal(signum, frame):
+    """No-op handler; the signal is picked up from the wakeup fd instead"""
+
+def wait_gpiod_events():
+    """
+    Primary detection path: request the button line through libgpiod and
+    block in epoll on its kernel line-event fd (/dev/gpiochipN) until a press
+    or a termination signal arrives. Returns True after a clean signal exit,
+    or False if the line could not be requested, so the caller can fall back
+    to RPi.GPIO.
+    """
+    chip = None
+    try:
+        chip = gpiod.Chip(GPIO_CHIP)
+        line = chip.get_line(BUTTON_PIN)
+        # For normally open button with pull-up, we're looking for HIGH->LOW transition
+        line.request(consumer="shutdown-btn",
+                     type=gpiod.LINE_REQ_EV_FALLING_EDGE,
+                     flags=gpiod.LINE_REQ_FLAG_BIAS_PULL_UP)
+    except Exception as e:
+        print(f"Requesting GPIO pin {BUTTON_PIN} through {GPIO_CHIP} failed: {e}")
+        if chip is not None:
+            chip.close()
+        return False
+    
+    # Deliver SIGTERM/SIGINT through a pipe so a single epoll wait covers both
+    # button edges and termination requests
+    signal_r, signal_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+    signal.set_wakeup_fd(signal_w)
+    signal.signal(signal.SIGTERM, ignore_signal)
+    signal.signal(signal.SIGINT, ignore_signal)
     
     try:
+        event_fd = line.event_get_fd()
+        epoll = select.epoll()
+        epoll.register(event_fd, select.EPOLLIN)
+        epoll.register(signal_r, select.EPOLLIN)
+        print(f"Monitoring button on GPIO pin {BUTTON_PIN} using gpiod line events...")
+        notify_systemd("READY=1")
+        
         while True:
-            current_state = GPIO.input(BUTTON_PIN)
-            
-            # For normally open button with pull-up, we're looking for HIGH->LOW transition
-            if prev_state == 1 and current_state == 0:
-                # Debounce
-                time.sleep(0.05)
-                # Verify state is still LOW
-                if GPIO.input(BUTTON_PIN) == 0:
-                    shutdown_system()
-            
-            prev_state = current_state
-            time.sleep(0.01)  # Short sleep to prevent CPU hogging
-    except Exception as e:
-        print(f"Error in polling loop: {e}")
+            # Block in epoll_wait(2) until an edge or a signal arrives; no timeout
+            ready = dict(epoll.poll())
+            if signal_r in ready:
+                break
+            line.event_read()
+            # Debounce
+            if DEBOUNCE_S:
+                select.select([], [], [], DEBOUNCE_S)
+            # Discard bounce edges queued while settling without blocking
+            while event_fd in dict(epoll.poll(0)):
+                line.event_read()
+            # Verify state is still LOW
+            if line.get_value() == 0:
+                shutdown_system()
     finally:
-        GPIO.cleanup()
+        signal.set_wakeup_fd(-1)
+        os.close(signal_r)
+        os.close(signal_w)
+        line.release()
+        chip.close()
+    return True
 
 def main():
     """
     Main function that sets up GPIO pin detection and waits indefinitely
     for button presses.
     """
+    global GPIO
+
     # Check if script is run as root
     if os.geteuid() != 0:
         print("This script must be run as root (sudo). Exiting.")
         sys.exit(1)
         
+    # Prefer kernel line events; RPi.GPIO is only used when they are unavailable
+    if gpiod is not None:
+        if wait_gpiod_events():
+            return
+        print("Falling back to RPi.GPIO edge detection...")
+
     # Register signal handlers for clean exit
     signal.signal(signal.SIGTERM, cleanup_handler)
     signal.signal(signal.SIGINT, cleanup_handler)
 
-    # Clean up GPIO in case it wasn't properly cleaned
-    GPIO.cleanup()
+    # Deferred so the gpiod path never loads the extension or maps GPIO memory
+    import RPi.GPIO as GPIO
 
     try:
         # Use BCM (Broadcom) pin numbering
         GPIO.setmode(GPIO.BCM)
         
-        # Set up pin without internal pull-up first
-        GPIO.setup(BUTTON_PIN, GPIO.IN)
+        # Configure the pin once with the internal pull-up (see wiring above)
+        GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         
-        # Try event detection method first
-        try:
-            print(f"Setting up edge detection on GPIO pin {BUTTON_PIN}...")
-            GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, 
-                                 callback=button_callback, 
-                                 bouncetime=200)
-            
-            print(f"Monitoring button on GPIO pin {BUTTON_PIN} using event detection...")
-            
-            # Keep the script running
-            while True:
-                time.sleep(0.5)
-                
-        except RuntimeError as e:
-            print(f"Edge detection failed: {e}")
-            print("Falling back to polling method...")
-            
-            # If event detection fails, fall back to polling
-            GPIO.remove_event_detect(BUTTON_PIN)
-            poll_button()
+        print(f"Setting up edge detection on GPIO pin {BUTTON_PIN}...")
+        GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, 
+                             callback=button_callback)
+        
+        print(f"Monitoring button on GPIO pin {BUTTON_PIN} using event detection...")
+        notify_systemd("READY=1")
+        
+        while True:
+            # Block until the callback reports an edge; no polling
+            button_pressed.wait()
+            # Debounce
+            if DEBOUNCE_S:
+                select.select([], [], [], DEBOUNCE_S)
+            # Edges that arrived while settling belong to the same press
+            button_pressed.clear()
+            # Ignore bounce spikes: verify the pin is still LOW after settling
+            if GPIO.input(BUTTON_PIN) == 0:
+                shutdown_system()
             
-    except Exception as e:
-        print(f"Setup error: {e}")
+    except RuntimeError as e:
+        print(f"Edge detection failed: {e}")
+        print("Install python3-libgpiod (v1 bindings) to use kernel line events instead.")
+        sys.exit(1)
     finally:
         GPIO.cleanup()
 